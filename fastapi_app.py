@@ -1,22 +1,35 @@
+import asyncio
+import atexit
+import multiprocessing
 import os
-import traceback
+import sys
+from concurrent.futures import ProcessPoolExecutor
+from contextlib import asynccontextmanager
 from fastapi import FastAPI, HTTPException, status, Request
-from fastapi.concurrency import run_in_threadpool
 from pydantic import BaseModel, HttpUrl
+from async_lru import alru_cache
 import uvicorn
 import logging
+import logging.handlers
+import queue
 from dotenv import load_dotenv  # <-- 1. IMPORT THIS
 
 # --- Load Environment Variables ---
 load_dotenv()  # <-- 2. CALL THIS FUNCTION
 
-# Import the logic from your video_analyzer.py file
-from video_analyzer import download_video_from_url, analyze_video
-
 # --- Logging Setup ---
-logging.basicConfig(level=logging.INFO)
+# Records are only enqueued by request code; a background listener thread
+# writes them out, so slow stdout/stderr never blocks the event loop.
+_log_queue: queue.SimpleQueue = queue.SimpleQueue()
+_log_listener = logging.handlers.QueueListener(_log_queue, logging.StreamHandler())
+logging.basicConfig(level=logging.INFO, handlers=[logging.handlers.QueueHandler(_log_queue)])
+_log_listener.start()
+atexit.register(_log_listener.stop)
 logger = logging.getLogger(__name__)
 
+# Import the logic from your video_analyzer.py file
+from video_analyzer import resolve_media, download_media, analyze_stream, analyze_video, create_http_client, warm_up_connections
+
 # --- Environment Variable Check ---
 # Check for API keys at startup
 if not os.environ.get("GOOGLE_API_KEY"):
@@ -26,11 +39,39 @@ if not os.environ.get("GOOGLE_API_KEY"):
 if not os.environ.get("TAVILY_API_KEY"):
     logger.warning("WARNING: TAVILY_API_KEY not set. Search functionality will fail.")
 
+# --- Result Cache Settings ---
+RESULT_CACHE_SIZE = int(os.environ.get("RESULT_CACHE_SIZE", 1024))
+RESULT_CACHE_TTL = int(os.environ.get("RESULT_CACHE_TTL", 3600))  # seconds
+
+# --- yt-dlp Extraction Pool ---
+# Processes (per server worker) that run yt-dlp's metadata extraction.
+EXTRACT_WORKERS = int(os.environ.get("EXTRACT_WORKERS", 2))
+
+# --- Application Lifespan ---
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """
+    Creates the shared HTTP client and the yt-dlp extraction process pool at
+    startup, and closes both at shutdown. Connections to the Gemini and Tavily
+    hosts are warmed in the background without delaying startup.
+    """
+    app.state.http = create_http_client()
+    warmup = asyncio.create_task(warm_up_connections(app.state.http))
+    # "spawn" avoids forking a process that already runs an event loop and threads.
+    app.state.extract_pool = ProcessPoolExecutor(
+        max_workers=EXTRACT_WORKERS, mp_context=multiprocessing.get_context("spawn")
+    )
+    yield
+    warmup.cancel()
+    await app.state.http.aclose()
+    app.state.extract_pool.shutdown(wait=False, cancel_futures=True)
+
 # --- FastAPI App Initialization ---
 app = FastAPI(
     title="Video Analyzer API",
     description="Analyzes a video from a URL, identifies the content, and finds streaming links.",
     version="1.0.0",
+    lifespan=lifespan,
 )
 
 # --- Request & Response Models ---
@@ -43,6 +84,74 @@ class ErrorResponse(BaseModel):
     """Pydantic model for error responses."""
     detail: str
 
+# --- Analysis Pipeline ---
+def _safe_unlink(path: str) -> None:
+    """Removes a local file, logging (not raising) errors."""
+    try:
+        logger.info(f"Cleaning up local file: {path}")
+        os.remove(path)
+    except FileNotFoundError:
+        pass
+    except Exception as e:
+        # Log cleanup error but don't crash the request
+        logger.error(f"Failed to clean up file {path}: {e}")
+
+
+# Successful results are cached per (url, prompt) so repeated requests for the
+# same video skip the download, upload, Gemini and Tavily calls entirely.
+# Concurrent requests for the same key also share the one in-flight call.
+# Failures raise and are therefore never cached.
+@alru_cache(maxsize=RESULT_CACHE_SIZE, ttl=RESULT_CACHE_TTL)
+async def _cached_pipeline(url: str, prompt: str) -> dict:
+    """Downloads and analyzes a video, returning the analyzer's result dict."""
+    local_video_path = None
+    try:
+        # 1. Resolve a direct media URL and, if possible, stream it straight
+        # into Gemini while it downloads (no local copy).
+        media = await resolve_media(url, app.state.extract_pool)
+        analysis_result = None
+        if media:
+            logger.info("Streaming video to Gemini...")
+            analysis_result = await analyze_stream(media, prompt, app.state.http)
+
+        if analysis_result is None:
+            # 2. Download Video
+            logger.info("Downloading video...")
+            local_video_path = await download_media(url, media, app.state.http)
+            
+            if not local_video_path:
+                logger.warning(f"Failed to download video from {url}")
+                raise HTTPException(
+                    status_code=status.HTTP_400_BAD_REQUEST,
+                    detail=f"Failed to download video from URL: {url}. The URL may be invalid or unsupported.",
+                )
+            
+            logger.info(f"Video downloaded to {local_video_path}")
+
+            # 3. Analyze Video
+            logger.info("Analyzing video...")
+            analysis_result = await analyze_video(local_video_path, prompt, app.state.http)
+        
+        if analysis_result.get("status") == "error":
+            logger.error(f"Analysis failed: {analysis_result.get('message')}")
+            # Pass the error from the analyzer to the client
+            raise HTTPException(
+                status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+                detail=f"Analysis Error: {analysis_result.get('message')}",
+            )
+
+        logger.info("Analysis complete.")
+        
+        # The result from analyze_video is already a dictionary
+        return analysis_result
+
+    finally:
+        # 4. CRITICAL: Clean up the local temporary file.
+        # Handed to a worker thread and not awaited, so the response is sent
+        # without waiting on the unlink.
+        if local_video_path:
+            asyncio.get_running_loop().run_in_executor(None, _safe_unlink, local_video_path)
+
 # --- API Endpoint ---
 @app.post(
     "/analyze-video",
@@ -58,72 +167,40 @@ async def analyze_video_endpoint(request: VideoRequest):
     """
     The main API endpoint to analyze a video.
     
-    This endpoint runs the blocking I/O (downloading, uploading, AI analysis)
-    in a separate thread pool to avoid blocking the server's event loop.
+    Downloading and analysis are awaited directly on the event loop, so a
+    request waiting on Gemini does not hold a thread.
     """
-    local_video_path = None
     try:
         logger.info(f"Received request for URL: {request.url}")
-        
-        # 1. Download Video
-        # Run the blocking download function in a thread pool
-        logger.info("Downloading video...")
-        local_video_path = await run_in_threadpool(
-            download_video_from_url, str(request.url)
-        )
-        
-        if not local_video_path:
-            logger.warning(f"Failed to download video from {request.url}")
-            raise HTTPException(
-                status_code=status.HTTP_400_BAD_REQUEST,
-                detail=f"Failed to download video from URL: {request.url}. The URL may be invalid or unsupported.",
-            )
-        
-        logger.info(f"Video downloaded to {local_video_path}")
-
-        # 2. Analyze Video
-        # Run the blocking analysis function in a thread pool
-        logger.info("Analyzing video...")
-        analysis_result = await run_in_threadpool(
-            analyze_video, local_video_path, request.prompt
-        )
-        
-        if analysis_result.get("status") == "error":
-            logger.error(f"Analysis failed: {analysis_result.get('message')}")
-            # Pass the error from the analyzer to the client
-            raise HTTPException(
-                status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
-                detail=f"Analysis Error: {analysis_result.get('message')}",
-            )
-
-        logger.info("Analysis complete.")
-        
-        # 3. Return Result
-        # The result from analyze_video is already a dictionary
-        return analysis_result
+        # alru_cache hands concurrent requests for the same (url, prompt) one
+        # shared call; shield it so one client disconnecting doesn't cancel it
+        # for the others.
+        return await asyncio.shield(_cached_pipeline(str(request.url), request.prompt))
 
     except HTTPException as http_exc:
         # Re-raise known HTTP exceptions
         raise http_exc
     except Exception as e:
         # Catch any other unexpected errors
-        logger.error(f"Unexpected error for {request.url}: {e}\n{traceback.format_exc()}")
+        logger.exception("Unexpected error for %s", request.url)
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
             detail=f"An unexpected server error occurred: {e}",
         )
-    finally:
-        # 4. CRITICAL: Clean up the local temporary file
-        if local_video_path and os.path.exists(local_video_path):
-            try:
-                logger.info(f"Cleaning up local file: {local_video_path}")
-                os.remove(local_video_path)
-            except Exception as e:
-                # Log cleanup error but don't crash the request
-                logger.error(f"Failed to clean up file {local_video_path}: {e}")
 
 # --- Main entry point to run the server ---
-# The if __name__ == "__main__": block has been removed.
-# Gunicorn will start the server directly by referencing the 'app' object.
-
-# The command is: gunicorn -w 4 -k uvicorn.workers.UvicornWorker fastapi_app:app
+# In production, Gunicorn starts the server directly by referencing the 'app' object:
+#   gunicorn -w 4 -k uvicorn.workers.UvicornWorker fastapi_app:app
+# UvicornWorker uses loop="auto" / http="auto", which picks uvloop and httptools
+# as long as they are installed (both are pinned in requirements.txt).
+#
+# For local runs (`python fastapi_app.py`) we ask for them explicitly.
+if __name__ == "__main__":
+    config = uvicorn.Config(
+        app,
+        host="0.0.0.0",
+        port=int(os.environ.get("PORT", 8000)),
+        loop="uvloop" if sys.platform != "win32" else "asyncio",  # uvloop has no Windows build
+        http="httptools",
+    )
+    uvicorn.Server(config).run()
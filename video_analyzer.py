@@ -1,275 +1,868 @@
-import google.generativeai as genai
+from google import genai
+from google.genai import types
+import asyncio
+import atexit
+import concurrent.futures
+import contextlib
+import errno
+import functools
+import hashlib
 import os
-import time
 import pathlib
+import re
 import yt_dlp
-import traceback
+import logging
+import mimetypes
+import mmap
 import json
-from langchain_tavily import TavilySearch
 import tempfile
 import uuid
 import shutil
+import threading
+import time
+import typing
+import httpx
+import aiofiles
+import diskcache
+import pydantic
+
+logger = logging.getLogger(__name__)
 
 # --- Configuration ---
-# API Keys (GOOGLE_API_KEY, TAVILY_API_KEY, YOUTUBE_COOKIES) are read from
-# environment variables.
+# API Keys (GOOGLE_API_KEY, TAVILY_API_KEY) and cookies (YOUTUBE_COOKIES, or
+# YOUTUBE_COOKIES_PATH for an existing cookies.txt) are read from environment
+# variables.
 # ---
 
+# Chunk size used when streaming a direct media URL to disk.
+STREAM_CHUNK_SIZE = 1 << 20  # 1 MiB
+
+# Streamed downloads up to this size go to tmpfs instead of disk (Docker's
+# default /dev/shm is 64 MB, so leave room for concurrent requests).
+SHM_DIR = "/dev/shm"
+SHM_MAX_BYTES = int(os.environ.get("SHM_MAX_BYTES", 32 * 1024 * 1024))
+
+# Backoff (in seconds) while waiting for Gemini to process an uploaded file.
+# Small clips are usually ready within a couple of seconds, so start short.
+FILE_POLL_INITIAL_DELAY = 0.5
+FILE_POLL_BACKOFF = 1.5
+FILE_POLL_MAX_DELAY = 5
+FILE_PROCESSING_TIMEOUT = 300  # Give up on a file stuck in PROCESSING after this long
+
+GEMINI_MODEL_NAME = "gemini-2.5-flash-preview-09-2025"
+
+# Upper bound on videos being uploaded to / analyzed by Gemini at once (per process).
+_GEMINI_SEM = asyncio.Semaphore(int(os.getenv("GEMINI_MAX_CONCURRENCY", "16")))
+
+# Videos analyzed at once by batch_analyze, sized for Gemini's ~500
+# requests-per-minute quota (one video takes well over a minute end-to-end).
+BATCH_CONCURRENCY = 500 // 60
+# Videos downloaded at once by batch_analyze.
+BATCH_DOWNLOAD_WORKERS = 4
+
+# Static parts of the title-extraction prompt and the search query.
+_TITLE_PROMPT_PREFIX = (
+    "From the following text, extract only the movie or game title. "
+    "If there is a year, include it. "
+    "Respond with *nothing but* the title and year (if present). "
+    "For example, from 'The movie clip is from **Fury** (2014), starring...' "
+    "you should respond with 'Fury (2014)'.\n\n"
+    "Text: \""
+)
+_TITLE_PROMPT_SUFFIX = "\""
+# Strips surrounding whitespace, markdown bold and quotes from the model's answer.
+_TITLE_CLEAN = re.compile(r'^[\s*"]+|[\s*"]+$')
+_TAVILY_QUERY_FMT = "where to legally watch {}".format
+
+# The main analysis call returns the answer and the title together (Gemini
+# structured output), so no second LLM round-trip is needed for the title.
+class _AnalysisResponse(pydantic.BaseModel):
+    analysis: str
+    title: str
+
+_STRUCTURED_OUTPUT_INSTRUCTIONS = (
+    "Put your full answer to the request above in the 'analysis' field. "
+    "Put only the movie or game title in the 'title' field, with the year in "
+    "parentheses if known (for example 'Fury (2014)'), or an empty string if "
+    "you cannot identify it."
+)
+# HttpOptions timeouts are in milliseconds.
+_ANALYSIS_GENERATION_CONFIG = types.GenerateContentConfig(
+    response_mime_type="application/json",
+    response_schema=_AnalysisResponse,
+    http_options=types.HttpOptions(timeout=600_000),
+)
+_TITLE_GENERATION_CONFIG = types.GenerateContentConfig(http_options=types.HttpOptions(timeout=60_000))
+# A bolded or quoted title followed by a year, e.g. **Fury** (2014) or "Fury" (2014).
+# Lets extract_title skip the LLM call when the analysis already names the title.
+# An opening ' must start a word, so apostrophes in the surrounding prose
+# ("It's from 'Inception' (2010)") aren't taken for quotes.
+_TITLE_RE = re.compile(r'(\*\*|"|(?<![^\s(])\')([^*"\n]{1,80}?)\1\s*\((\d{4})\)')
+
+# Gemini Files API endpoints: resumable uploads, and file metadata for polling.
+GEMINI_UPLOAD_URL = "https://generativelanguage.googleapis.com/upload/v1beta/files"
+GEMINI_API_URL = "https://generativelanguage.googleapis.com/v1beta"
+
+TAVILY_SEARCH_URL = "https://api.tavily.com/search"
+TAVILY_MAX_RESULTS = 5
+
+# Search results are cached on disk by normalized title, shared by all workers.
+SEARCH_CACHE_DIR = os.environ.get("SEARCH_CACHE_DIR", os.path.join(tempfile.gettempdir(), "tavily_cache"))
+SEARCH_CACHE_TTL = 7 * 24 * 3600  # seconds
+_NON_WORD = re.compile(r'\W+')
+
+# Analysis results are cached on disk by a fingerprint of the video (first MiB
+# plus size) and the prompt, so re-analyzing the same video skips Gemini.
+ANALYSIS_CACHE_DIR = os.environ.get("ANALYSIS_CACHE_DIR", os.path.join(tempfile.gettempdir(), "gemini_cache"))
+ANALYSIS_CACHE_TTL = 7 * 24 * 3600  # seconds
+FINGERPRINT_BYTES = 1 << 20  # 1 MiB
+
+# Connection pool for the shared HTTP client (downloads and Tavily calls).
+HTTP_LIMITS = httpx.Limits(max_keepalive_connections=100, max_connections=200)
+HTTP_TIMEOUT = httpx.Timeout(60.0, connect=10.0)
+# Hosts the API talks to on every request; warmed at startup so the first
+# request reuses a live TLS connection instead of paying DNS + handshake.
+_WARMUP_URLS = ("https://generativelanguage.googleapis.com/", "https://api.tavily.com/")
+
+def create_http_client() -> httpx.AsyncClient:
+    """
+    Builds the HTTP/2 client shared by downloads and API calls. The API creates
+    one per worker at startup so TLS connections are reused across requests.
+    """
+    return httpx.AsyncClient(http2=True, limits=HTTP_LIMITS, timeout=HTTP_TIMEOUT, follow_redirects=True)
+
+@contextlib.asynccontextmanager
+async def _http_client(http: httpx.AsyncClient | None):
+    """Yields the given client, or a temporary one when called outside the API."""
+    if http is not None:
+        yield http
+    else:
+        async with create_http_client() as client:
+            yield client
+
+async def warm_up_connections(http: httpx.AsyncClient) -> None:
+    """
+    Opens connections to the Gemini and Tavily hosts with cheap HEAD requests,
+    leaving them in the shared client's pool. Failures are ignored; the real
+    request will simply connect on its own.
+    """
+    responses = await asyncio.gather(*(http.head(url) for url in _WARMUP_URLS), return_exceptions=True)
+    for url, response in zip(_WARMUP_URLS, responses):
+        if isinstance(response, Exception):
+            logger.warning(f"Could not warm up connection to {url}: {response}")
+
+_client: genai.Client | None = None
+_client_lock = threading.Lock()
+
+def _get_client() -> genai.Client:
+    """
+    Builds the Gen AI client once per process, so every request (and the
+    title extraction) shares its HTTP/2 connection pool.
+    """
+    global _client
+    if _client is None:
+        with _client_lock:
+            if _client is None:
+                logger.info("Configuring Generative AI client...")
+                _client = genai.Client(
+                    api_key=os.environ["GOOGLE_API_KEY"],
+                    http_options=types.HttpOptions(async_client_args={"http2": True}),
+                )
+    return _client
+
+@functools.lru_cache(maxsize=1)
+def _get_search_cache() -> diskcache.Cache:
+    """Opens the on-disk search result cache once per process."""
+    return diskcache.Cache(SEARCH_CACHE_DIR)
+
+@functools.lru_cache(maxsize=1)
+def _get_analysis_cache() -> diskcache.Cache:
+    """Opens the on-disk analysis result cache once per process."""
+    return diskcache.Cache(ANALYSIS_CACHE_DIR)
+
+def _video_fingerprint(video_file_path: str, file_size: int, prompt: str) -> str:
+    """
+    Hashes the first FINGERPRINT_BYTES of the video together with its size
+    and the prompt. Cheap to compute, and distinct enough for cache keys.
+    """
+    with open(video_file_path, 'rb') as f:
+        head = f.read(FINGERPRINT_BYTES)
+    digest = hashlib.blake2b(head, digest_size=16)
+    digest.update(str(file_size).encode())
+    digest.update(prompt.encode())
+    return digest.hexdigest()
+
+def _remove_file(path: str) -> None:
+    """Removes a file, ignoring it if it is already gone."""
+    try:
+        os.remove(path)
+    except FileNotFoundError:
+        pass
+
+def _write_cookie_file() -> str | None:
+    """
+    Finds the cookie file for yt-dlp. YOUTUBE_COOKIES_PATH points at an existing
+    cookies.txt; otherwise the YOUTUBE_COOKIES contents are written to a
+    temporary file, removed at exit. Returns the path, or None without cookies.
+    """
+    cookies_path = os.environ.get("YOUTUBE_COOKIES_PATH")
+    if cookies_path:
+        logger.info(f"Using cookie file from YOUTUBE_COOKIES_PATH: {cookies_path}")
+        return cookies_path
+
+    cookies_content = os.environ.get("YOUTUBE_COOKIES")
+    if not cookies_content:
+        logger.warning("No YOUTUBE_COOKIES found.")
+        return None
+
+    logger.info("Found YOUTUBE_COOKIES environment variable. Creating cookie file...")
+    # delete=False is important so we can close it and let yt-dlp open it
+    with tempfile.NamedTemporaryFile(mode='w+', delete=False, suffix='.txt') as cookie_file:
+        cookie_file.write(cookies_content)
+    atexit.register(_remove_file, cookie_file.name)
+    # Extraction processes spawned later inherit the path instead of writing their own copy.
+    os.environ["YOUTUBE_COOKIES_PATH"] = cookie_file.name
+    logger.info("Cookies configured.")
+    return cookie_file.name
+
+# Written once per process tree at import and shared by every YoutubeDL.
+_COOKIE_PATH = _write_cookie_file()
+_COOKIE_OPTS = {'cookiefile': _COOKIE_PATH} if _COOKIE_PATH else {}
+
+# yt-dlp options for resolving a direct media URL without downloading.
+_PROBE_YDL_OPTS = {
+    # A single progressive file (video+audio) that can be fetched with one GET.
+    'format': 'best[ext=mp4][acodec!=none][vcodec!=none]/best[acodec!=none][vcodec!=none]',
+    'quiet': True,
+    'noplaylist': True,
+    'skip_download': True,
+    'extractor_args': {'youtube': {'player_client': ['android', 'web']}},
+}
+
+# yt-dlp download tuning shared by both download strategies.
+_YDL_DOWNLOAD_OPTS = {
+    'concurrent_fragment_downloads': 4,  # Parallel fragments for HLS/DASH sources
+    'http_chunk_size': 10 * 1024 * 1024,  # Ranged GETs for plain HTTP sources
+    'buffersize': 1024 * 1024,  # Fewer, larger reads and writes per download
+}
+
+# Every download lands in the temp dir under a per-call id passed through
+# extract_info's extra_info, so one YoutubeDL can serve many downloads.
+_DOWNLOAD_OUTTMPL = str(pathlib.Path(tempfile.gettempdir()) / "%(download_id)s.%(ext)s")
+
+@functools.lru_cache(maxsize=1)
+def _ffmpeg_available() -> bool:
+    return shutil.which('ffmpeg') is not None
+
+def _download_ydl_opts() -> dict:
+    """
+    Returns the yt-dlp download options, adapting the strategy to whether
+    FFmpeg is available.
+    """
+    if _ffmpeg_available():
+        logger.info("[Strategy] High Quality (FFmpeg detected).")
+        # With FFmpeg, we can download best video + best audio and merge them.
+        return {
+            # mp4+m4a merge without re-encoding; the later entries are fallbacks
+            # so a single extraction handles every case.
+            'format': 'bestvideo[ext=mp4]+bestaudio[ext=m4a]/bestvideo+bestaudio/best[ext=mp4]/best',
+            'merge_output_format': 'mp4',
+            'outtmpl': _DOWNLOAD_OUTTMPL,
+            'quiet': True,
+            'noplaylist': True,
+            'extractor_args': {'youtube': {'player_client': ['android', 'web']}},
+            **_YDL_DOWNLOAD_OPTS,
+        }
+
+    logger.info("[Strategy] Safe Mode (No FFmpeg). Relaxing format constraints.")
+    # Without FFmpeg, we CANNOT merge. We must find a single file.
+    # Prefer mp4, but allow webm/mkv if that's all that exists.
+    return {
+        'format': 'best[ext=mp4]/best', # Best single file with video+audio
+        'outtmpl': _DOWNLOAD_OUTTMPL,
+        'quiet': True,
+        'noplaylist': True,
+        **_YDL_DOWNLOAD_OPTS,
+    }
+
+# YoutubeDL is not thread-safe, so each thread (or extraction process) keeps
+# its own instances.
+_thread_ydl = threading.local()
+
+def _make_ydl(name: str, make_opts: typing.Callable[[], dict]) -> yt_dlp.YoutubeDL:
+    """
+    Returns this thread's YoutubeDL registered under name, creating it from
+    make_opts() on first use. Reusing it keeps extractors, cookies and
+    yt-dlp's pooled HTTP session warm instead of rebuilding them (and redoing
+    TLS) on every call.
+    """
+    ydl = getattr(_thread_ydl, name, None)
+    if ydl is None:
+        ydl = yt_dlp.YoutubeDL({**make_opts(), **_COOKIE_OPTS})
+        setattr(_thread_ydl, name, ydl)
+    return ydl
+
+def _get_probe_ydl() -> yt_dlp.YoutubeDL:
+    """
+    Returns this thread's YoutubeDL for metadata extraction.
+    """
+    return _make_ydl("probe", lambda: _PROBE_YDL_OPTS)
+
+def _get_download_ydl() -> yt_dlp.YoutubeDL:
+    """
+    Returns this thread's YoutubeDL for full downloads.
+    """
+    return _make_ydl("download", _download_ydl_opts)
+
+def resolve_media_url(url: str) -> dict | None:
+    """
+    Uses yt-dlp to *extract* (not download) a direct media URL for a video.
+    Returns a dict with the direct 'url', the 'headers' needed to fetch it and
+    the file 'ext', or None if the video has no single-file HTTP(S) stream.
+    This is the only blocking step of the streaming download path.
+    """
+    try:
+        ydl = _get_probe_ydl()
+        logger.info("Resolving direct media URL...")
+        info = ydl.extract_info(url, download=False)
+
+        media_url = info.get('url')
+        if not media_url or info.get('protocol') not in ('http', 'https'):
+            logger.info(f"No direct HTTP stream available (protocol: {info.get('protocol')}).")
+            return None
+
+        headers = dict(info.get('http_headers') or {})
+        cookie_header = ydl.cookiejar.get_cookie_header(media_url)
+        if cookie_header:
+            headers['Cookie'] = cookie_header
+
+        return {'url': media_url, 'headers': headers, 'ext': info.get('ext') or 'mp4'}
+
+    except Exception as e:
+        logger.warning(f"Could not resolve a direct media URL: {e}")
+        return None
+
+def _preallocate(fd: int, size: int) -> None:
+    """
+    Reserves disk space for a download of known size (Linux/Unix only), so the
+    filesystem allocates the file in one go instead of on every write and a
+    full disk fails the request up front (ENOSPC) rather than halfway through.
+    """
+    if size <= 0 or not hasattr(os, "posix_fallocate"):
+        return
+    try:
+        os.posix_fallocate(fd, 0, size)
+    except OSError as e:
+        if e.errno == errno.ENOSPC:
+            raise
+        # Not supported by every filesystem; the download still works without it.
+        logger.warning(f"Could not preallocate {size} bytes: {e}")
+
+def _create_scratch_file(filename: str, size: int) -> str:
+    """
+    Creates (and, when the size is known, preallocates) the file a download is
+    streamed into. Downloads up to SHM_MAX_BYTES go to tmpfs, so the bytes are
+    uploaded from memory without a disk round-trip; larger downloads, or ones
+    that no longer fit in tmpfs, go to the regular temp directory.
+    """
+    candidate_dirs = [tempfile.gettempdir()]
+    if 0 < size <= SHM_MAX_BYTES and os.path.isdir(SHM_DIR):
+        candidate_dirs.insert(0, SHM_DIR)
+
+    for i, directory in enumerate(candidate_dirs):
+        path = os.path.join(directory, filename)
+        fd = os.open(path, os.O_WRONLY | os.O_CREAT | os.O_EXCL, 0o600)
+        try:
+            _preallocate(fd, size)
+            return path
+        except OSError:
+            os.remove(path)
+            if i == len(candidate_dirs) - 1:
+                raise
+            logger.warning(f"Not enough space in {directory}, falling back to {candidate_dirs[i + 1]}.")
+        finally:
+            os.close(fd)
+
+async def stream_to_tempfile(media: dict, http: httpx.AsyncClient) -> str | None:
+    """
+    Streams a direct media URL (as returned by resolve_media_url) into a
+    *unique temporary file* on the event loop, without holding a worker thread
+    for the duration of the transfer. Returns the file path, or None on failure.
+    """
+    local_path = None
+
+    try:
+        async with http.stream("GET", media['url'], headers=media['headers']) as response:
+            response.raise_for_status()
+            logger.info("Streaming video...")
+            # With a Content-Encoding the header is the compressed size, not what we write.
+            content_length = 0 if "Content-Encoding" in response.headers else int(response.headers.get("Content-Length") or 0)
+            local_path = await asyncio.to_thread(
+                _create_scratch_file, f"{uuid.uuid4()}.{media['ext']}", content_length
+            )
+            # 'r+b' keeps the preallocated extent ('wb' would truncate it).
+            async with aiofiles.open(local_path, 'r+b') as f:
+                async for chunk in response.aiter_bytes(STREAM_CHUNK_SIZE):
+                    await f.write(chunk)
+
+    except Exception as e:
+        logger.exception("Error streaming video: %s", e)
+        if local_path:
+            _remove_file(local_path)
+        return None
+
+    if os.stat(local_path).st_size == 0:
+        logger.error("Error: Streamed file is empty.")
+        _remove_file(local_path)
+        return None
+
+    logger.info(f"Download complete: {local_path}")
+    return local_path
+
+async def _resumable_upload(
+    http: httpx.AsyncClient,
+    size: int,
+    mime_type: str,
+    display_name: str,
+    content: typing.AsyncIterable[bytes],
+) -> dict:
+    """
+    Uploads size bytes from content to the Gemini Files API with a single
+    resumable upload session. Returns the file resource ('name', 'uri',
+    'mimeType', 'state', ...).
+    """
+    start = await http.post(
+        GEMINI_UPLOAD_URL,
+        headers={
+            "x-goog-api-key": os.environ["GOOGLE_API_KEY"],
+            "X-Goog-Upload-Protocol": "resumable",
+            "X-Goog-Upload-Command": "start",
+            "X-Goog-Upload-Header-Content-Length": str(size),
+            "X-Goog-Upload-Header-Content-Type": mime_type,
+        },
+        json={"file": {"display_name": display_name}},
+    )
+    start.raise_for_status()
+
+    finished = await http.post(
+        start.headers["X-Goog-Upload-URL"],
+        headers={
+            "Content-Length": str(size),
+            "X-Goog-Upload-Offset": "0",
+            "X-Goog-Upload-Command": "upload, finalize",
+        },
+        content=content,
+    )
+    finished.raise_for_status()
+    return finished.json()["file"]
+
+async def _mmap_chunks(mm: mmap.mmap) -> typing.AsyncIterator[bytes]:
+    """Yields the mapped file in STREAM_CHUNK_SIZE pieces."""
+    for offset in range(0, len(mm), STREAM_CHUNK_SIZE):
+        # Slicing can fault pages in from disk, so it runs off the event loop.
+        yield await asyncio.to_thread(mm.__getitem__, slice(offset, offset + STREAM_CHUNK_SIZE))
+
+async def upload_file(video_file_path: str, http: httpx.AsyncClient) -> dict:
+    """
+    Uploads a local video to Gemini over the shared HTTP client. The file is
+    memory-mapped rather than read through Python file buffers, so the page
+    cache holds the only full copy. Returns the uploaded file resource.
+    """
+    mime_type = mimetypes.guess_type(video_file_path)[0] or "video/mp4"
+    with open(video_file_path, 'rb') as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+        if hasattr(mm, "madvise"):
+            mm.madvise(mmap.MADV_SEQUENTIAL)
+        return await _resumable_upload(http, len(mm), mime_type, os.path.basename(video_file_path), _mmap_chunks(mm))
+
+async def stream_upload(media: dict, http: httpx.AsyncClient) -> dict | None:
+    """
+    Pipes a direct media URL (as returned by resolve_media_url) into a Gemini
+    resumable upload: every downloaded chunk is forwarded as it arrives.
+    Needs the size up front, so it only works when the source sends a
+    Content-Length. Returns the uploaded file resource, or None if the stream
+    could not be uploaded.
+    """
+    try:
+        async with http.stream("GET", media['url'], headers=media['headers']) as response:
+            response.raise_for_status()
+            # With a Content-Encoding the header is the compressed size, not what we'd send.
+            size = 0 if "Content-Encoding" in response.headers else int(response.headers.get("Content-Length") or 0)
+            if not size:
+                logger.info("Stream size unknown; cannot upload it directly.")
+                return None
+
+            content_type = response.headers.get("Content-Type", "")
+            mime_type = content_type if content_type.startswith("video/") else f"video/{media['ext']}"
+
+            logger.info(f"Streaming {size / (1024*1024):.2f} MB directly to Gemini...")
+            return await _resumable_upload(
+                http, size, mime_type, f"{uuid.uuid4()}.{media['ext']}", response.aiter_bytes(STREAM_CHUNK_SIZE)
+            )
+
+    except Exception as e:
+        logger.exception("Error streaming video to Gemini: %s", e)
+        return None
+
+async def resolve_media(url: str, extract_executor: concurrent.futures.Executor | None = None) -> dict | None:
+    """
+    Async wrapper around resolve_media_url.
+    yt-dlp's metadata extraction is CPU-heavy and holds the GIL, so the API
+    passes a process pool as extract_executor to keep it off the server's
+    threads; by default it runs in the event loop's thread pool.
+    """
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(extract_executor, resolve_media_url, url)
+
+async def download_media(url: str, media: dict | None, http: httpx.AsyncClient | None = None) -> str | None:
+    """
+    Downloads a video to a *unique temporary file*, streaming the already
+    resolved direct media URL with httpx when there is one. Falls back to a
+    full yt-dlp download (in a worker thread) for sources that need merging
+    or segmented protocols.
+    """
+    if media:
+        async with _http_client(http) as client:
+            local_path = await stream_to_tempfile(media, client)
+        if local_path:
+            return local_path
+        logger.warning("Direct stream failed, falling back to yt-dlp download.")
+
+    return await asyncio.to_thread(download_video_from_url, url)
+
+async def fetch_video(
+    url: str,
+    http: httpx.AsyncClient | None = None,
+    extract_executor: concurrent.futures.Executor | None = None,
+) -> str | None:
+    """
+    Downloads a video from a URL to a *unique temporary file*.
+    See resolve_media and download_media.
+    """
+    media = await resolve_media(url, extract_executor)
+    return await download_media(url, media, http)
+
 def download_video_from_url(url: str) -> str | None:
     """
     Downloads a video from a URL to a *unique temporary file*.
     Adapts strategy based on whether FFmpeg is available.
     """
-    import pathlib
-    import traceback
-    
-    cookie_file_path = None
-    
     try:
-        temp_dir = tempfile.gettempdir()
         unique_filename_base = str(uuid.uuid4())
         
-        # Check if FFmpeg is installed
-        ffmpeg_available = shutil.which('ffmpeg') is not None
-        print(f"  FFmpeg available: {ffmpeg_available}")
-
-        # --- Cookies Handling ---
-        cookie_args = {}
-        cookies_content = os.environ.get("YOUTUBE_COOKIES")
-        if cookies_content:
-            print("  Found YOUTUBE_COOKIES environment variable. Creating cookie file...")
-            # delete=False is important so we can close it and let yt-dlp open it
-            with tempfile.NamedTemporaryFile(mode='w+', delete=False, suffix='.txt') as cookie_file:
-                cookie_file.write(cookies_content)
-                cookie_file_path = cookie_file.name
-            cookie_args['cookiefile'] = cookie_file_path
-            print("  Cookies configured.")
-        else:
-            print("  WARNING: No YOUTUBE_COOKIES found.")
-        # ------------------------
-
-        # --- STRATEGY 1: Determine Options ---
-        if ffmpeg_available:
-            print("  [Strategy] High Quality (FFmpeg detected).")
-            # With FFmpeg, we can download best video + best audio and merge them.
-            output_template = str(pathlib.Path(temp_dir) / f"{unique_filename_base}.%(ext)s")
-            ydl_opts = {
-                'format': 'bestvideo+bestaudio/best',
-                'merge_output_format': 'mp4',
-                'outtmpl': output_template,
-                'quiet': True,
-                'noplaylist': True,
-                'extractor_args': {'youtube': {'player_client': ['android', 'web']}},
-                **cookie_args
-            }
-        else:
-            print("  [Strategy] Safe Mode (No FFmpeg). Relaxing format constraints.")
-            # Without FFmpeg, we CANNOT merge. We must find a single file.
-            # We remove [ext=mp4] to allow webm/mkv if that's all that exists.
-            output_template = str(pathlib.Path(temp_dir) / f"{unique_filename_base}.%(ext)s")
-            ydl_opts = {
-                'format': 'best', # Just get the best single file with video+audio
-                'outtmpl': output_template,
-                'quiet': True,
-                'noplaylist': True,
-                **cookie_args
-            }
+        logger.info(f"FFmpeg available: {_ffmpeg_available()}")
 
         # --- DOWNLOAD ATTEMPT ---
-        downloaded_filepath = None
-        
-        try:
-            with yt_dlp.YoutubeDL(ydl_opts) as ydl:
-                print("  Fetching info and downloading...")
-                info = ydl.extract_info(url, download=True)
-                
-                if ffmpeg_available:
-                    # If we merged, it should be .mp4
-                    expected = str(pathlib.Path(temp_dir) / f"{unique_filename_base}.mp4")
-                    if os.path.exists(expected):
-                        downloaded_filepath = expected
-                    else:
-                        downloaded_filepath = ydl.prepare_filename(info)
-                else:
-                    # If we didn't merge, we trust prepare_filename, but check for existence
-                    temp_path = ydl.prepare_filename(info)
-                    if os.path.exists(temp_path):
-                        downloaded_filepath = temp_path
-                    else:
-                        # Fallback search for any file with our UUID
-                        print("  Primary path not found, searching for download...")
-                        for file in pathlib.Path(temp_dir).glob(f"{unique_filename_base}.*"):
-                            downloaded_filepath = str(file)
-                            break
-
-        except Exception as first_error:
-            print(f"  [Warning] First download attempt failed: {first_error}")
-            # --- STRATEGY 2: Last Resort (If first attempt failed) ---
-            if not ffmpeg_available:
-                print("  [Strategy] Last Resort. Trying 'worst' quality to ensure success.")
-                ydl_opts['format'] = 'worst' # Often guarantees a simple single file (360p)
-                try:
-                    with yt_dlp.YoutubeDL(ydl_opts) as ydl:
-                        info = ydl.extract_info(url, download=True)
-                        downloaded_filepath = ydl.prepare_filename(info)
-                except Exception as second_error:
-                    print(f"  [Error] Last resort failed: {second_error}")
-                    raise second_error # Re-raise if even this fails
+        # The format fallbacks in _download_ydl_opts replace a separate retry round-trip.
+        ydl = _get_download_ydl()
+        logger.info("Fetching info and downloading...")
+        info = ydl.extract_info(url, download=True, extra_info={'download_id': unique_filename_base})
+
+        # yt-dlp reports the final path (after any merge) for each requested
+        # download, so there's no need to guess the extension or scan the temp dir.
+        requested = info.get('requested_downloads') or [{}]
+        downloaded_filepath = requested[-1].get('filepath') or ydl.prepare_filename(info)
 
         # Final Validation
-        if not downloaded_filepath or not os.path.exists(downloaded_filepath) or os.path.getsize(downloaded_filepath) == 0:
-            print("Error: Download failed, file is empty or does not exist.")
-            if downloaded_filepath and os.path.exists(downloaded_filepath):
-                os.remove(downloaded_filepath) 
+        try:
+            file_size = os.stat(downloaded_filepath).st_size if downloaded_filepath else 0
+        except FileNotFoundError:
+            file_size = 0
+        if file_size == 0:
+            logger.error("Error: Download failed, file is empty or does not exist.")
+            if downloaded_filepath:
+                _remove_file(downloaded_filepath)
             return None
 
-        print(f"  Download complete: {downloaded_filepath}")
+        logger.info(f"Download complete: {downloaded_filepath}")
         return downloaded_filepath
     
     except Exception as e:
-        print(f"Error downloading video from URL: {e}")
-        traceback.print_exc()
+        logger.exception("Error downloading video from URL: %s", e)
         return None
-    
-    finally:
-        # Clean up the temporary cookie file
-        if cookie_file_path and os.path.exists(cookie_file_path):
-            try:
-                os.remove(cookie_file_path)
-            except Exception:
-                pass
 
-def extract_title(analysis_text: str, model: genai.GenerativeModel) -> str:
+def download_videos_from_urls(urls: list[str]) -> list[str | None]:
+    """
+    Downloads several videos with yt-dlp, BATCH_DOWNLOAD_WORKERS at a time.
+    Each worker thread reuses one YoutubeDL across its URLs, so extractor
+    setup and cookie parsing happen once per thread rather than per video.
+    Returns one local path (or None on failure) per URL, in the same order.
+    """
+    with concurrent.futures.ThreadPoolExecutor(max_workers=BATCH_DOWNLOAD_WORKERS) as pool:
+        return list(pool.map(download_video_from_url, urls))
+
+async def extract_title(analysis_text: str, client: genai.Client) -> str:
     """
-    Uses the LLM to extract a clean movie/game title from the analysis text.
+    Extracts a clean movie/game title from the analysis text. A bolded or
+    quoted "Title (YYYY)" is taken directly; only ambiguous text goes to the LLM.
     """
+    match = _TITLE_RE.search(analysis_text)
+    if match:
+        return f"{match.group(2).strip()} ({match.group(3)})"
+
     try:
-        print("Extracting title from analysis...")
-        prompt = (
-            "From the following text, extract only the movie or game title. "
-            "If there is a year, include it. "
-            "Respond with *nothing but* the title and year (if present). "
-            f"For example, from 'The movie clip is from **Fury** (2014), starring...' "
-            "you should respond with 'Fury (2014)'.\n\n"
-            f"Text: \"{analysis_text}\""
-        )
+        logger.info("Extracting title from analysis...")
+        prompt = _TITLE_PROMPT_PREFIX + analysis_text + _TITLE_PROMPT_SUFFIX
         
-        response = model.generate_content(
-            prompt,
-            request_options={"timeout": 60}
+        response = await client.aio.models.generate_content(
+            model=GEMINI_MODEL_NAME,
+            contents=prompt,
+            config=_TITLE_GENERATION_CONFIG,
         )
-        title = response.text.strip().strip('*"')
+        title = _TITLE_CLEAN.sub("", response.text)
         return title
     except Exception as e:
-        print(f"Error during title extraction: {e}")
+        logger.error(f"Error during title extraction: {e}")
         return "Unknown Title"
 
-def search_for_title(title: str) -> dict:
+async def _tavily_search(title: str, cache_key: str, http: httpx.AsyncClient) -> dict:
+    """
+    Calls the Tavily REST endpoint over the shared HTTP client and caches
+    the result under cache_key.
+    """
+    try:
+        query = _TAVILY_QUERY_FMT(title)
+        response = await http.post(
+            TAVILY_SEARCH_URL,
+            json={"query": query, "max_results": TAVILY_MAX_RESULTS},
+            headers={"Authorization": f"Bearer {os.environ['TAVILY_API_KEY']}"},
+        )
+        response.raise_for_status()
+        data = response.json()
+        search_docs = data.get("results", [])
+        
+        if not search_docs:
+            logger.info(f"No search results found for '{query}'.")
+            result = {"status": "no_results", "message": f"No search results found for '{query}'."}
+        else:
+            logger.info("Search successful.")
+            result = {"status": "success", "results": search_docs}
+
+        # Errors (below) are not cached, so they are retried next time.
+        await asyncio.to_thread(_get_search_cache().set, cache_key, result, expire=SEARCH_CACHE_TTL)
+        return result
+
+    except Exception as e:
+        error_msg = f"An unexpected error occurred during Tavily search: {e}"
+        logger.exception(error_msg)
+        return {"status": "error", "message": error_msg}
+
+# In-flight Tavily searches by cache key, so concurrent lookups of the same
+# title (e.g. several videos of one film in a batch) share a single request.
+_search_inflight: dict[str, asyncio.Future] = {}
+
+def _search_cache_key(title: str) -> str:
+    # "Fury (2014)" and "fury 2014" share a cache entry.
+    return _NON_WORD.sub("", title.lower())
+
+async def search_for_title(title: str, http: httpx.AsyncClient) -> dict:
     """
     Uses Tavily to search for legal streaming options for the extracted title.
+    Calls the REST endpoint directly over the shared HTTP client.
     Returns a dictionary with search status and results.
     """
-    import traceback
-    
-    print(f"Searching for streaming options for '{title}'...")
+    logger.info(f"Searching for streaming options for '{title}'...")
     
     if "TAVILY_API_KEY" not in os.environ:
         error_msg = "TAVILY_API_KEY environment variable not set. Cannot perform search."
-        print(f"\nError: {error_msg}")
+        logger.error(error_msg)
         return {"status": "error", "message": error_msg}
 
+    cache_key = _search_cache_key(title)
+    cached = await asyncio.to_thread(_get_search_cache().get, cache_key)
+    if cached is not None:
+        logger.info("Using cached search results.")
+        return cached
+
+    task = _search_inflight.get(cache_key)
+    if task is None:
+        task = asyncio.ensure_future(_tavily_search(title, cache_key, http))
+        _search_inflight[cache_key] = task
+        task.add_done_callback(lambda _: _search_inflight.pop(cache_key, None))
+    else:
+        logger.info("Joining in-flight search.")
+    # Shielded so one cancelled caller doesn't cancel the search for the others.
+    return await asyncio.shield(task)
+
+async def search_for_titles(titles: list[str], http: httpx.AsyncClient) -> dict[str, dict]:
+    """
+    Searches for several titles concurrently. Titles that normalize to the
+    same cache key are searched once (Tavily has no bulk endpoint).
+    Returns a dictionary mapping each title to its search result.
+    """
+    unique = {_search_cache_key(title): title for title in titles}
+    results = await asyncio.gather(*(search_for_title(title, http) for title in unique.values()))
+    by_key = dict(zip(unique, results))
+    return {title: by_key[_search_cache_key(title)] for title in titles}
+
+def _parse_analysis_response(response_text: str) -> tuple[str, str | None]:
+    """
+    Splits the structured analysis response into (analysis text, title).
+    If the response isn't the expected JSON, the raw text is the analysis and
+    the title is None, to be extracted from it later.
+    """
     try:
-        tavily_search = TavilySearch(max_results=5)
-        query = f"where to legally watch {title}"
-        data = tavily_search.invoke({"query": query})
-        search_docs = data.get("results", [])
-        
-        if not search_docs:
-            print(f"No search results found for '{query}'.")
-            return {"status": "no_results", "message": f"No search results found for '{query}'."}
+        data = json.loads(response_text)
+        analysis_text, title = data["analysis"], data["title"]
+    except (ValueError, KeyError, TypeError):
+        logger.warning("Analysis response was not structured JSON; falling back to text.")
+        return response_text, None
 
-        print("Search successful.")
-        return {"status": "success", "results": search_docs}
+    title = _TITLE_CLEAN.sub("", title or "")
+    return analysis_text, title or "Unknown Title"
+
+async def find_streaming_options(analysis_text: str, title: str | None, client: genai.Client, http: httpx.AsyncClient) -> tuple[str, dict]:
+    """
+    Searches for the title reported by the analysis. When the analysis did not
+    report one (title is None), it is first extracted from the analysis text.
+    Returns the title and the search result dictionary.
+    """
+    if title is None:
+        title = await extract_title(analysis_text, client)
 
+    if title and title != "Unknown Title":
+        logger.info(f"Extracted Title: {title}")
+        return title, await search_for_title(title, http)
+
+    logger.warning("Could not extract a usable title.")
+    return title, {"status": "skipped", "message": "Unknown title"}
+
+async def _get_remote_file(video_file_name: str, http: httpx.AsyncClient) -> dict:
+    """Fetches an uploaded file's metadata (including its 'state') from Gemini."""
+    response = await http.get(
+        f"{GEMINI_API_URL}/{video_file_name}",
+        headers={"x-goog-api-key": os.environ["GOOGLE_API_KEY"]},
+    )
+    response.raise_for_status()
+    return response.json()
+
+async def _delete_remote_file(video_file_name: str) -> None:
+    """Deletes an uploaded file from Gemini, logging (not raising) errors."""
+    try:
+        logger.info(f"Cleaning up uploaded remote file: {video_file_name}...")
+        await _get_client().aio.files.delete(name=video_file_name)
+        logger.info("Remote cleanup complete.")
     except Exception as e:
-        error_msg = f"An unexpected error occurred during Tavily search: {e}"
-        print(error_msg)
-        traceback.print_exc()
-        return {"status": "error", "message": error_msg}
+        logger.error(f"Error during remote file cleanup: {e}")
+
+# Uploads of local files in use, keyed by (st_dev, st_ino, st_size,
+# st_mtime_ns), with how many analyses hold each one. Concurrent analyses of
+# the same file (e.g. with different prompts) share one upload, and the remote
+# copy is deleted only when the last of them releases it.
+_shared_uploads: dict[tuple, asyncio.Future] = {}
+_shared_upload_refs: dict[tuple, int] = {}
 
-def analyze_video(video_file_path: str, prompt: str) -> dict:
+async def _acquire_upload(key: tuple, upload: typing.Callable[[], typing.Awaitable[dict]]) -> dict:
     """
-    Analyzes a local video file using the Gemini API.
-    Returns a dictionary containing the analysis, title, and search results.
+    Returns the uploaded file resource for key, starting upload() unless an
+    upload of the same file is already running or done. Every successful
+    call must be paired with _release_upload(key).
+    """
+    task = _shared_uploads.get(key)
+    if task is None:
+        task = asyncio.ensure_future(upload())
+        _shared_uploads[key] = task
+        _shared_upload_refs[key] = 0
+    else:
+        logger.info("Reusing the upload of the same local file.")
+    _shared_upload_refs[key] += 1
+    try:
+        return await asyncio.shield(task)
+    except BaseException:
+        await _release_upload(key)
+        raise
+
+async def _release_upload(key: tuple) -> None:
+    """Drops one reference to a shared upload, deleting it after the last one."""
+    _shared_upload_refs[key] -= 1
+    if _shared_upload_refs[key]:
+        return
+    del _shared_upload_refs[key]
+    task = _shared_uploads.pop(key)
+    if not task.done():
+        task.cancel()
+    elif not task.cancelled() and task.exception() is None:
+        await _delete_remote_file(task.result()["name"])
+
+async def _analyze_upload(
+    upload: typing.Callable[[], typing.Awaitable[dict | None]],
+    prompt: str,
+    http: httpx.AsyncClient,
+    release: typing.Callable[[str], typing.Awaitable[None]] = _delete_remote_file,
+) -> dict | None:
+    """
+    The analysis flow shared by local files and direct streams: uploads the
+    video by awaiting upload(), waits for Gemini to process it, runs the
+    analysis and looks up streaming options. Afterwards the uploaded file is
+    handed to release(), which deletes it by default.
+    Processing is polled over the shared HTTP/2 client, so many videos can
+    wait concurrently on the event loop without tying up worker threads.
+    Returns None (without analyzing) if upload() returns None.
     """
-    import traceback
-    
     video_file_name = None
     
     if "GOOGLE_API_KEY" not in os.environ:
         error_msg = "Error: GOOGLE_API_KEY environment variable not set."
-        print(error_msg)
+        logger.error(error_msg)
         return {"status": "error", "message": error_msg}
 
     try:
-        print("Configuring Generative AI client...")
-        genai.configure(api_key=os.environ["GOOGLE_API_KEY"])
+        client = _get_client()
 
-        if not pathlib.Path(video_file_path).exists():
-            error_msg = f"Error: Video file not found at path: {video_file_path}"
-            print(error_msg)
-            return {"status": "error", "message": error_msg}
-        
-        file_size = os.path.getsize(video_file_path)
-        if file_size == 0:
-            error_msg = f"Error: Video file is empty: {video_file_path}"
-            print(error_msg)
-            return {"status": "error", "message": error_msg}
-        print(f"File size: {file_size / (1024*1024):.2f} MB")
-
-        print(f"Uploading file: {video_file_path}...")
-        video_file = genai.upload_file(path=video_file_path)
-        video_file_name = video_file.name
-
-        print(f"File uploaded: {video_file.name}. Waiting for processing...")
-        while video_file.state.name == "PROCESSING":
-            print("  Waiting for file processing...")
-            time.sleep(10)
-            video_file = genai.get_file(video_file.name)
-
-        if video_file.state.name == "FAILED":
-            error_msg = "Error: File upload failed. State: FAILED"
-            print(error_msg)
-            return {"status": "error", "message": error_msg}
-
-        if video_file.state.name != "ACTIVE":
-            error_msg = f"Error: File is not active. State: {video_file.state.name}"
-            print(error_msg)
-            return {"status": "error", "message": error_msg}
-
-        print("File processed and active.")
-        print("Sending request to Gemini API...")
-
-        model = genai.GenerativeModel(model_name="gemini-2.5-flash-preview-09-2025")
-
-        response = model.generate_content(
-            [prompt, video_file],
-            request_options={"timeout": 600} 
-        )
+        # Bound concurrent uploads/analyses; requests above the cap wait here
+        # instead of piling up on Gemini's side and hitting rate limits.
+        async with _GEMINI_SEM:
+            video_file = await upload()
+            if video_file is None:
+                return None
+            video_file_name = video_file["name"]
 
-        print("Analysis complete.")
-        analysis_text = response.text
+            logger.info(f"File uploaded: {video_file_name}. Waiting for processing...")
+            delay = FILE_POLL_INITIAL_DELAY
+            deadline = time.monotonic() + FILE_PROCESSING_TIMEOUT
+            while video_file.get("state") == "PROCESSING":
+                if time.monotonic() >= deadline:
+                    error_msg = f"Error: File processing timed out after {FILE_PROCESSING_TIMEOUT}s."
+                    logger.error(error_msg)
+                    return {"status": "error", "message": error_msg}
+                logger.info(f"Waiting for file processing ({delay:.1f}s)...")
+                await asyncio.sleep(delay)
+                delay = min(delay * FILE_POLL_BACKOFF, FILE_POLL_MAX_DELAY)
+                video_file = await _get_remote_file(video_file_name, http)
+
+            state = video_file.get("state")
+            if state == "FAILED":
+                error_msg = "Error: File upload failed. State: FAILED"
+                logger.error(error_msg)
+                return {"status": "error", "message": error_msg}
+
+            if state != "ACTIVE":
+                error_msg = f"Error: File is not active. State: {state}"
+                logger.error(error_msg)
+                return {"status": "error", "message": error_msg}
+
+            logger.info("File processed and active.")
+            logger.info("Sending request to Gemini API...")
+
+            response = await client.aio.models.generate_content(
+                model=GEMINI_MODEL_NAME,
+                contents=[
+                    prompt,
+                    _STRUCTURED_OUTPUT_INSTRUCTIONS,
+                    types.Part.from_uri(file_uri=video_file["uri"], mime_type=video_file["mimeType"]),
+                ],
+                config=_ANALYSIS_GENERATION_CONFIG,
+            )
+
+        logger.info("Analysis complete.")
+        analysis_text, title = _parse_analysis_response(response.text or "")
+
+        # The uploaded file is no longer needed: delete it while we look up the title.
+        remote_file_name, video_file_name = video_file_name, None
+        (title, search_data), _ = await asyncio.gather(
+            find_streaming_options(analysis_text, title, client, http),
+            release(remote_file_name),
+        )
 
-        title = extract_title(analysis_text, model)
-        search_data = {}
-        
-        if title and title != "Unknown Title":
-            print(f"Extracted Title: {title}")
-            search_data = search_for_title(title)
-        else:
-            print("Could not extract a usable title.")
-            search_data = {"status": "skipped", "message": "Unknown title"}
-        
         return {
             "status": "success",
             "analysis": analysis_text,
@@ -279,15 +872,128 @@ def analyze_video(video_file_path: str, prompt: str) -> dict:
 
     except Exception as e:
         error_msg = f"An unexpected error occurred during analysis: {e}"
-        print(error_msg)
-        traceback.print_exc()
+        logger.exception(error_msg)
         return {"status": "error", "message": error_msg}
     
     finally:
         if video_file_name:
-            try:
-                print(f"Cleaning up uploaded remote file: {video_file_name}...")
-                genai.delete_file(video_file_name)
-                print("Remote cleanup complete.")
-            except Exception as e:
-                print(f"Error during remote file cleanup: {e}")
+            await release(video_file_name)
+
+async def analyze_video(video_file_path: str, prompt: str, http: httpx.AsyncClient | None = None) -> dict:
+    """
+    Analyzes a local video file using the Gemini API.
+    Returns a dictionary containing the analysis, title, and search results.
+    The upload and the wait for file processing run on the event loop over
+    the shared HTTP client.
+    """
+    try:
+        stat = os.stat(video_file_path)
+    except FileNotFoundError:
+        error_msg = f"Error: Video file not found at path: {video_file_path}"
+        logger.error(error_msg)
+        return {"status": "error", "message": error_msg}
+    
+    file_size = stat.st_size
+    if file_size == 0:
+        error_msg = f"Error: Video file is empty: {video_file_path}"
+        logger.error(error_msg)
+        return {"status": "error", "message": error_msg}
+    logger.info(f"File size: {file_size / (1024*1024):.2f} MB")
+
+    cache = _get_analysis_cache()
+    cache_key = await asyncio.to_thread(_video_fingerprint, video_file_path, file_size, prompt)
+    cached = await asyncio.to_thread(cache.get, cache_key)
+    if cached is not None:
+        logger.info("Using cached analysis.")
+        return cached
+
+    upload_key = (stat.st_dev, stat.st_ino, stat.st_size, stat.st_mtime_ns)
+    async with _http_client(http) as client:
+        async def upload():
+            logger.info(f"Uploading file: {video_file_path}...")
+            return await upload_file(video_file_path, client)
+
+        result = await _analyze_upload(
+            lambda: _acquire_upload(upload_key, upload),
+            prompt,
+            client,
+            release=lambda _: _release_upload(upload_key),
+        )
+    # Only successful analyses are cached, so failures are retried next time.
+    if result and result.get("status") == "success":
+        await asyncio.to_thread(cache.set, cache_key, result, expire=ANALYSIS_CACHE_TTL)
+    return result
+
+async def analyze_stream(media: dict, prompt: str, http: httpx.AsyncClient | None = None) -> dict | None:
+    """
+    Analyzes a direct media stream (as returned by resolve_media_url) by
+    piping it straight into Gemini, so downloading and uploading overlap and
+    no local copy is written.
+    Returns the same dictionary as analyze_video, or None (before anything is
+    analyzed) if the stream cannot be uploaded this way, so the caller can
+    fall back to downloading the file.
+    """
+    async with _http_client(http) as client:
+        return await _analyze_upload(lambda: stream_upload(media, client), prompt, client)
+
+async def batch_analyze(urls: list[str], prompt: str) -> list[dict]:
+    """
+    Downloads and analyzes several videos as a two-stage pipeline sharing one
+    HTTP client: download workers hand finished files to analysis workers
+    through a bounded queue, so the next videos download while earlier ones
+    are uploaded to and analyzed by Gemini.
+    Returns one result dictionary per URL, in the same order.
+    """
+    results: list[dict | None] = [None] * len(urls)
+    download_q: asyncio.Queue = asyncio.Queue()
+    # Bounded so downloads can't run far ahead of analysis and fill the disk.
+    analyze_q: asyncio.Queue = asyncio.Queue(maxsize=BATCH_CONCURRENCY)
+    for item in enumerate(urls):
+        download_q.put_nowait(item)
+
+    async with create_http_client() as http:
+        async def download_worker() -> None:
+            while not download_q.empty():
+                index, url = download_q.get_nowait()
+                local_path = await fetch_video(url, http)
+                if local_path:
+                    await analyze_q.put((index, local_path))
+                else:
+                    error_msg = f"Failed to download video from URL: {url}"
+                    logger.error(error_msg)
+                    results[index] = {"status": "error", "message": error_msg}
+
+        async def analyze_worker() -> None:
+            while (item := await analyze_q.get()) is not None:
+                index, local_path = item
+                try:
+                    results[index] = await analyze_video(local_path, prompt, http)
+                except Exception as e:
+                    # Keep consuming the queue; a dead worker would stall the downloads.
+                    error_msg = f"An unexpected error occurred during analysis: {e}"
+                    logger.exception(error_msg)
+                    results[index] = {"status": "error", "message": error_msg}
+                finally:
+                    _remove_file(local_path)
+
+        analyzers = [asyncio.create_task(analyze_worker()) for _ in range(BATCH_CONCURRENCY)]
+        try:
+            await asyncio.gather(*(download_worker() for _ in range(BATCH_DOWNLOAD_WORKERS)))
+            for _ in analyzers:
+                await analyze_q.put(None)  # One stop signal per analysis worker
+            await asyncio.gather(*analyzers)
+        finally:
+            for task in analyzers:
+                task.cancel()
+            # Remove downloads that never reached an analysis worker.
+            while not analyze_q.empty():
+                item = analyze_q.get_nowait()
+                if item is not None:
+                    _remove_file(item[1])
+
+    return results
+
+# Configure the Gemini client at import time when the key is already set, so
+# the first request doesn't pay for it.
+if os.environ.get("GOOGLE_API_KEY"):
+    _get_client()